@@ -4,10 +4,29 @@ Camera Abstraction Layer for PyTimeLapse.
 Defines a base structure and placeholder implementations for different camera systems.
 """
 
+import functools
+import logging
 import os
-import cv2
+from abc import ABC, abstractmethod
+import queue
+import sys
+import threading
 import time
 
+log = logging.getLogger(__name__)
+
+# cv2 and numpy are imported where they are used, so that selecting a
+# non-OpenCV camera (or just running --help) does not pay for them
+
+# Number of reusable frame buffers shared by the capture and writer threads
+FRAME_POOL_SIZE = 3
+# Attempts made to open a camera before giving up, with exponential backoff
+OPEN_ATTEMPTS = 3
+# SCHED_FIFO priority requested for the Raspberry Pi capture thread (0 disables)
+CAPTURE_PRIORITY = 20
+# JPEG quality used when saving captured frames
+JPEG_QUALITY = 90
+
 
 class CameraError(Exception):
     """Custom exception for camera-related errors."""
@@ -15,27 +34,108 @@ class CameraError(Exception):
     pass
 
 
-class CameraBase:
-    """Base class for camera implementations."""
+class ImageSaveError(CameraError):
+    """Raised when an image that capture_image accepted could not be saved."""
+
+    def __init__(self, message, filepath):
+        super().__init__(message)
+        self.filepath = filepath
+
+
+def detect_operating_system(platform):
+    """Map a sys.platform string to 'macos', 'linux' or 'unsupported'."""
+    if platform == "darwin":
+        return "macos"
+    elif platform.startswith("linux"):
+        return "linux"
+    else:
+        return "unsupported"
+
+
+# the platform cannot change while the process runs, so detect it once
+_OS = detect_operating_system(sys.platform)
+
+
+# Shared PyTurboJPEG encode function; None until first use, False if unavailable
+_turbojpeg_encode = None
+
+
+def _get_turbojpeg_encode():
+    """Return the shared PyTurboJPEG encode function, or None if unavailable."""
+    global _turbojpeg_encode
+    if _turbojpeg_encode is None:
+        try:
+            from turbojpeg import TJSAMP_420, TurboJPEG
+
+            # same quality and 4:2:0 chroma subsampling as the OpenCV path
+            _turbojpeg_encode = functools.partial(
+                TurboJPEG().encode, quality=JPEG_QUALITY, jpeg_subsample=TJSAMP_420
+            )
+        except (ImportError, OSError, RuntimeError) as e:
+            # missing package or libturbojpeg; fall back to OpenCV's encoder
+            log.debug("PyTurboJPEG unavailable, encoding with OpenCV: %s", e)
+            _turbojpeg_encode = False
+    return _turbojpeg_encode or None
+
+
+def _encode_jpeg(frame):
+    """Encode a frame to JPEG in memory and return the encoded buffer."""
+    turbojpeg_encode = _get_turbojpeg_encode()
+    if turbojpeg_encode is not None:
+        return turbojpeg_encode(frame)
+
+    import cv2
+
+    # skip the slow Huffman optimization pass; progressive is off by default
+    ok, buf = cv2.imencode(
+        ".jpg",
+        frame,
+        [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 0],
+    )
+    if not ok:
+        raise CameraError("Failed to encode image (cv2.imencode returned false).")
+    return buf
+
+
+def _write_file(filepath, buf):
+    """Write an encoded image buffer to disk with one open/write/close."""
+    data = memoryview(buf).cast("B")
+    fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data) :]
+    finally:
+        os.close(fd)
+
+
+class CameraBase(ABC):
+    """Abstract base class for camera implementations."""
+
+    # True if capture_frame is implemented, i.e. --stream-video can be used
+    supports_streaming = False
 
     def __init__(self, config=None):
         """Initialize with optional configuration."""
         self.config = config if config else {}
-        print(f"{self.__class__.__name__}: Base init")
+        log.debug("%s: Base init", self.__class__.__name__)
 
+    @abstractmethod
     def initialize(self):
         """Set up the camera hardware/connection."""
-        print(f"{self.__class__.__name__}: Base initialize (Not implemented)")
 
+    @abstractmethod
     def capture_image(self, filepath):
         """Capture a single image and save it to the specified path."""
-        print(
-            f"{self.__class__.__name__}: Base capture_image to {filepath} (Not implemented)"
+
+    def capture_frame(self):
+        """Capture a single frame and return it as a BGR array without saving it."""
+        raise CameraError(
+            f"{self.__class__.__name__} does not support streaming frames."
         )
 
+    @abstractmethod
     def shutdown(self):
         """Release camera resources cleanly."""
-        print(f"{self.__class__.__name__}: Base shutdown (Not implemented)")
 
     def __enter__(self):
         """Context manager entry: initialize the camera."""
@@ -50,27 +150,64 @@ class CameraBase:
 class MacCamera(CameraBase):
     """Placeholder implementation for macOS camera (using OpenCV later)."""
 
+    supports_streaming = True
+
     def __init__(self, config=None):
         super().__init__(config)
         self.camera_index = self.config.get("camera_index", 0)
         self.resolution = self.config.get("resolution", None)
+        import cv2
+
+        # open AVFoundation directly instead of letting OpenCV probe backends
+        self.backend = self.config.get("backend", cv2.CAP_AVFOUNDATION)
+        self.warm_up_time = self.config.get("warm_up_time", 2.0)
         self.capture = None
-        print(
-            f"MacCamera: Configured for index {self.camera_index}, resolution {self.resolution or 'default'}"
+        self._ensured_dirs = set()  # output directories already created
+        self._stream_frame = None  # reused by every capture_frame call
+        # frame pool and background writer state, created in initialize()
+        self._pool = []
+        self._free_frames = None  # indices of pool buffers not in use
+        self._write_queue = None
+        self._writer = None
+        # first save failure in the writer thread, raised by the next call
+        self._write_error = None
+        self._write_error_lock = threading.Lock()
+        log.info(
+            "MacCamera: Configured for index %s, resolution %s",
+            self.camera_index,
+            self.resolution or "default",
         )
 
     def initialize(self):
-        print("MacCamera: Initializing cv2.VideoCapture({self.camera_index})")
+        import cv2
+        import numpy as np
+
+        log.info("MacCamera: Initializing cv2.VideoCapture(%s)", self.camera_index)
         try:
-            self.capture = cv2.VideoCapture(self.camera_index)
-            if not self.capture.isOpened():
-                time.sleep(0.5)
+            for attempt in range(OPEN_ATTEMPTS):
+                self.capture = cv2.VideoCapture(self.camera_index, self.backend)
+                if self.capture.isOpened():
+                    break
                 self.capture.release()
-                self.capture = cv2.VideoCapture(self.camera_index)
-                if not self.capture.isOpened():
-                    raise CameraError(
-                        f"Cannot open camera at index {self.camera_index}"
+                self.capture = None
+                if attempt + 1 < OPEN_ATTEMPTS:
+                    # back off in case the camera is still held by another process
+                    delay = 0.25 * (2**attempt)
+                    log.warning(
+                        "MacCamera: Cannot open camera %s, retrying in %.2f seconds...",
+                        self.camera_index,
+                        delay,
                     )
+                    time.sleep(delay)
+            else:
+                raise CameraError(
+                    f"Cannot open camera at index {self.camera_index} after {OPEN_ATTEMPTS} attempts"
+                )
+
+            # keep the driver queue one frame deep so reads are not stale
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            buffer_size = self.capture.get(cv2.CAP_PROP_BUFFERSIZE)
+            log.info("MacCamera: Requested buffer size 1, Actual: %d", buffer_size)
 
             # set resolution if specified
             if self.resolution and len(self.resolution) == 2:
@@ -80,29 +217,57 @@ class MacCamera(CameraBase):
                 # verify if resolution was set
                 actual_width = self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)
                 actual_height = self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
-                print(
-                    f"MacCamera: Requested resolution {width}x{height}, Actual: {int(actual_width)}x{int(actual_height)}"
+                log.info(
+                    "MacCamera: Requested resolution %sx%s, Actual: %dx%d",
+                    width,
+                    height,
+                    actual_width,
+                    actual_height,
                 )
 
             # --- Add warm-up delay and frame discard ---
-            print("MacCamera: Warming up camera (allowing time for auto-exposure)...")
-            warm_up_time = 2.0
-            start_time = time.time()
+            log.info(
+                "MacCamera: Warming up camera (allowing time for auto-exposure)..."
+            )
+            now = time.monotonic  # hoisted, the loop runs at the camera frame rate
+            start_time = now()
+            deadline = start_time + self.warm_up_time
             frame_count = 0
-            while time.time() - start_time < warm_up_time:
-                ret, _ = self.capture.read()
+            while now() < deadline:
+                # grab() advances the driver queue without decoding the frame
+                ret = self.capture.grab()
                 frame_count += 1
                 if not ret:
-                    print("MacCamera: Warning - Frame drop during warm-up.")
-            print(
-                f"MacCamera: Warm-up complete. Read {frame_count} frames in {time.time() - start_time:.2f} seconds."
+                    log.warning("MacCamera: Frame drop during warm-up.")
+            log.info(
+                "MacCamera: Warm-up complete. Grabbed %d frames in %.2f seconds.",
+                frame_count,
+                now() - start_time,
             )
             # --- End warm-up delay ---
-            print(f"MacCamera: Camera {self.camera_index} initialized successfully.")
+
+            # preallocate the pool of frame buffers that retrieve() decodes into
+            frame_width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            frame_height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if frame_width > 0 and frame_height > 0:
+                self._pool = [
+                    np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+                    for _ in range(FRAME_POOL_SIZE)
+                ]
+            else:
+                self._pool = [None] * FRAME_POOL_SIZE
+            self._free_frames = queue.Queue()
+            for index in range(FRAME_POOL_SIZE):
+                self._free_frames.put(index)
+
+            self._start_writer()
+            log.info(
+                "MacCamera: Camera %s initialized successfully.", self.camera_index
+            )
 
         except Exception as e:
             # clean up if initialization fails
-            if self.capture:
+            if self.capture is not None:
                 self.capture.release()
             self.capture = None
             raise CameraError(f"Failed during MacCamera initialization: {e}") from e
@@ -110,40 +275,127 @@ class MacCamera(CameraBase):
     def capture_image(self, filepath):
         if not self.capture or not self.capture.isOpened():
             raise CameraError("MacCamera is not initialized or has been shut down.")
-        print(f"MacCamera: Reading frame from camera {self.camera_index}...")
+        self._raise_write_error()
+        output_dir = os.path.dirname(filepath)
+        if output_dir and output_dir not in self._ensured_dirs:
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+            except OSError as e:
+                raise CameraError(f"Error saving image to {filepath}: {e}") from e
+            self._ensured_dirs.add(output_dir)
 
-        ret, frame = self.capture.read()
+        try:
+            index = self._free_frames.get_nowait()
+        except queue.Empty:
+            raise CameraError(
+                f"Image writer is falling behind, dropped frame for {filepath}."
+            ) from None
+
+        log.debug("MacCamera: Reading frame from camera %s...", self.camera_index)
+        ret, frame = False, None
+        if self.capture.grab():
+            ret, frame = self.capture.retrieve(self._pool[index])
         if not ret or frame is None:
+            self._free_frames.put(index)
             raise CameraError(
-                "Failed to capture image from camera {self.camera_index}."
+                f"Failed to capture image from camera {self.camera_index}."
             )
+        # retrieve() returns a new array when the buffer shape does not match
+        self._pool[index] = frame
 
-        print(f"MacCamera: Saving frame to {filepath}...")
-        try:
-            output_dir = os.path.dirname(filepath)
-            if output_dir:
-                os.makedirs(output_dir, exist_ok=True)
+        # the writer hands the buffer back to the free queue once encoded
+        self._write_queue.put((index, filepath))
+        log.debug("MacCamera: Queued frame for saving to %s.", filepath)
+        return True
 
-            success = cv2.imwrite(filepath, frame)
-            if not success:
-                raise CameraError(
-                    f"Failed to save image to {filepath} (cv2.imwrite returned false)."
-                )
-            print(f"MacCamera: Image saved successfully to {filepath}.")
-            return True
-        except Exception as e:
-            raise CameraError(f"Error saving image to {filepath}: {e}") from e
+    def capture_frame(self):
+        """Capture a frame into a reused buffer, valid until the next call."""
+        if not self.capture or not self.capture.isOpened():
+            raise CameraError("MacCamera is not initialized or has been shut down.")
+        log.debug("MacCamera: Reading frame from camera %s...", self.camera_index)
+        ret, frame = False, None
+        if self.capture.grab():
+            ret, frame = self.capture.retrieve(self._stream_frame)
+        if not ret or frame is None:
+            raise CameraError(
+                f"Failed to capture image from camera {self.camera_index}."
+            )
+        self._stream_frame = frame
+        return frame
+
+    def _start_writer(self):
+        """Start the background thread that encodes and saves captured frames."""
+        # the frame pool bounds how many frames can be waiting in this queue
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._write_frames, name="MacCameraWriter", daemon=True
+        )
+        self._writer.start()
+
+    def _write_frames(self):
+        """Writer thread loop: save queued frames until a None sentinel arrives."""
+        while True:
+            item = self._write_queue.get()
+            try:
+                if item is None:
+                    return
+                index, filepath = item
+                try:
+                    buf = _encode_jpeg(self._pool[index])
+                finally:
+                    self._free_frames.put(index)
+                _write_file(filepath, buf)
+                log.debug("MacCamera: Image saved successfully to %s.", filepath)
+            except Exception as e:
+                log.error("MacCamera: Error saving image to %s: %s", filepath, e)
+                with self._write_error_lock:
+                    if self._write_error is None:
+                        self._write_error = ImageSaveError(
+                            f"Error saving image to {filepath}: {e}", filepath
+                        )
+            finally:
+                self._write_queue.task_done()
+
+    def _raise_write_error(self):
+        """Raise (once) the ImageSaveError for a frame the writer failed to save."""
+        with self._write_error_lock:
+            error, self._write_error = self._write_error, None
+        if error is not None:
+            raise error
+
+    def _stop_writer(self):
+        """Flush queued frames to disk and stop the writer thread."""
+        if self._writer is None:
+            return
+        log.info("MacCamera: Waiting for queued images to be saved...")
+        self._write_queue.join()
+        self._write_queue.put(None)
+        self._writer.join()
+        self._writer = None
+        self._write_queue = None
+        self._free_frames = None
+        self._pool = []
 
     def shutdown(self):
+        try:
+            self._stop_writer()
+        finally:
+            self._release_capture()
+        self._raise_write_error()
+
+    def _release_capture(self):
+        """Release the OpenCV capture device."""
         if self.capture and self.capture.isOpened():
-            print(f"MacCamera: Releasing camera {self.camera_index}...")
+            log.info("MacCamera: Releasing camera %s...", self.camera_index)
             self.capture.release()
-            print(f"MacCamera: Camera {self.camera_index} released.")
+            log.info("MacCamera: Camera %s released.", self.camera_index)
         else:
-            print(
-                f"MacCamera: Shutdown called, but camera {self.camera_index} was not active."
+            log.info(
+                "MacCamera: Shutdown called, but camera %s was not active.",
+                self.camera_index,
             )
         self.capture = None
+        self._stream_frame = None
 
 
 class PiCamera(CameraBase):
@@ -151,41 +403,76 @@ class PiCamera(CameraBase):
 
     def __init__(self, config=None):
         super().__init__(config)
-        print("PiCamera: Initialized (Placeholder)")
+        self.capture_priority = self.config.get("capture_priority", CAPTURE_PRIORITY)
+        self._saved_scheduler = None  # (policy, param) to restore on shutdown
+        log.info("PiCamera: Initialized (Placeholder)")
 
     def initialize(self):
-        print("PiCamera: Setting up Raspberry Pi camera... (Placeholder)")
+        log.info("PiCamera: Setting up Raspberry Pi camera... (Placeholder)")
+        self._raise_capture_priority()
         return True
 
+    def _raise_capture_priority(self):
+        """Run the calling (capture) thread under SCHED_FIFO to reduce jitter."""
+        if not self.capture_priority or not hasattr(os, "sched_setscheduler"):
+            return
+        try:
+            saved = (os.sched_getscheduler(0), os.sched_getparam(0))
+            os.sched_setscheduler(
+                0, os.SCHED_FIFO, os.sched_param(self.capture_priority)
+            )
+        except OSError as e:
+            # PermissionError without CAP_SYS_NICE, EINVAL outside 1-99
+            log.warning(
+                "PiCamera: Could not use real-time priority %s (%s), "
+                "capturing at normal priority.",
+                self.capture_priority,
+                e,
+            )
+            return
+        self._saved_scheduler = saved
+        log.info(
+            "PiCamera: Capture thread running with SCHED_FIFO priority %s.",
+            self.capture_priority,
+        )
+
+    def _restore_priority(self):
+        """Restore the scheduling policy saved by _raise_capture_priority."""
+        if self._saved_scheduler is None:
+            return
+        policy, param = self._saved_scheduler
+        self._saved_scheduler = None
+        try:
+            os.sched_setscheduler(0, policy, param)
+        except OSError as e:
+            log.warning("PiCamera: Could not restore scheduling policy: %s", e)
+
     def capture_image(self, filepath):
-        print(f"PiCamera: Capturing image to {filepath}... (Placeholder)")
+        log.debug("PiCamera: Capturing image to %s... (Placeholder)", filepath)
         # Placeholder for actual image capture logic
         return True
 
     def shutdown(self):
-        print("PiCamera: Shutting down Raspberry Pi camera... (Placeholder)")
+        log.info("PiCamera: Shutting down Raspberry Pi camera... (Placeholder)")
+        # video compilation runs after capture and must not inherit SCHED_FIFO
+        self._restore_priority()
+
+
+# Camera implementation for each supported os_type
+_CAMERAS = {"macos": MacCamera, "linux": PiCamera}
 
 
 def get_camera(os_type="auto", config=None):
     """Factory function to get the appropriate camera class based on the OS."""
     if os_type == "auto":
-        import sys
+        if _OS == "unsupported":
+            raise CameraError(f"Unsupported OS for camera detection: {sys.platform}")
+        os_type = _OS
 
-        platform = sys.platform
-        if platform == "darwin":
-            os_type = "macos"
-        elif platform.startswith("linux"):
-            os_type = "linux"
-        else:
-            raise CameraError(f"Unsupported OS for camera detection: {platform}")
-
-    if os_type == "macos":
-        print("Selecting MacCamera implementation.")
-        return MacCamera(config)
-    elif os_type == "linux":
-        print("Selecting PiCamera implementation.")
-        return PiCamera(config)
-    else:
+    camera_cls = _CAMERAS.get(os_type)
+    if camera_cls is None:
         raise ValueError(
             f"Invalid os_type specified: {os_type}. Supported types are 'macos' and 'linux'."
         )
+    log.info("Selecting %s implementation.", camera_cls.__name__)
+    return camera_cls(config)
@@ -4,32 +4,41 @@ A cross-platform timelapse camera application for MacOS and Raspberry Pi OS.
 """
 
 import sys
-import argparse
+import functools
+import logging
 import os
 import time
 import datetime
 
 # Import camera classes and factory function
-from camera import CameraError, get_camera
+from camera import CameraError, ImageSaveError, detect_operating_system, get_camera
 
 # Import video compilation util
-from video_utils import compile_video_ffmpeg
+from video_utils import (
+    AUTO_HW_ACCEL,
+    HW_ENCODERS,
+    VideoError,
+    VideoStream,
+    check_ffmpeg,
+    compile_video_ffmpeg,
+)
+
+log = logging.getLogger(__name__)
+
+# resolved once at import; sys.platform is fixed for the process lifetime
+_OS = detect_operating_system(sys.platform)
 
 
 def get_operating_system():
-    """Detect the underlying operating system."""
+    """Return the underlying operating system detected at import time."""
+    return _OS
 
-    os_name = sys.platform
-    if os_name == "darwin":
-        return "macos"
-    elif os_name.startswith("linux"):
-        return "linux"
-    else:
-        return "unsupported"
 
+@functools.lru_cache(maxsize=None)
+def _build_parser():
+    """Builds the command-line parser once; argparse is only imported here."""
+    import argparse
 
-def parse_arguments():
-    """Parses command-line arguments."""
     parser = argparse.ArgumentParser(
         description="PyTimeLapse - Capture timelapse sequences."
     )
@@ -72,8 +81,30 @@ def parse_arguments():
         default="timelapse.mp4",
         help="Filename for the compiled video (default: timeplapse.mp4).",
     )
+    parser.add_argument(
+        "--hw-accel",
+        choices=["none", "auto", *HW_ENCODERS],
+        default="none",
+        help="Hardware encoder for --compile-video; 'auto' picks one for the OS (default: none).",
+    )
+    parser.add_argument(
+        "--stream-video",
+        action="store_true",
+        help="Pipe frames straight into ffmpeg while capturing instead of saving images (requires ffmpeg).",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Show progress messages (-v) or per-capture debug details (-vv).",
+    )
+    return parser
+
 
-    args = parser.parse_args()
+def parse_arguments():
+    """Parses command-line arguments."""
+    args = _build_parser().parse_args()
     return args
 
 
@@ -82,6 +113,10 @@ def main():
     # --- Placeholder for future logic ---
     # 1. Parse arguments
     args = parse_arguments()
+    logging.basicConfig(
+        level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)],
+        format="%(message)s",
+    )
     print("Configuration:")
     print(f" Interval: {args.interval} seconds")
     print(f" Output Directory: {args.output}")
@@ -99,8 +134,18 @@ def main():
     if current_os == "unsupported":
         print(f"Error: Unsupported operating system '{sys.platform}'. Exiting.")
         sys.exit(1)
+
+    if args.stream_video and not check_ffmpeg():
+        print("Error: --stream-video requires ffmpeg, which was not found. Exiting.")
+        sys.exit(1)
+    if args.stream_video and args.compile_video:
+        print("Warning: --compile-video is ignored, --stream-video writes the video.")
+    if args.stream_video and args.hw_accel != "none":
+        print("Warning: --hw-accel is ignored, --stream-video encodes with libx264.")
+
     # 3. Initialize camera based on platform
     camera = None
+    video_stream = None
     images_captured = 0
     start_time = time.monotonic()
     try:
@@ -117,6 +162,19 @@ def main():
         camera_config = {}
         camera = get_camera(os_type=current_os, config=camera_config)
 
+        if args.stream_video and not camera.supports_streaming:
+            print(
+                f"Error: --stream-video is not supported by {type(camera).__name__}. Exiting."
+            )
+            sys.exit(1)
+
+        if args.stream_video:
+            video_stream = VideoStream(
+                os.path.join(args.output, args.video_filename),
+                fps=args.fps,
+                verbose=args.verbose > 0,
+            )
+
         # use context manager for automatic setup/teardown
         with camera:
             print("Camera initialized successfully. Starting timelapse capture...")
@@ -124,46 +182,95 @@ def main():
 
             # Start timelapse loop
             capture_count = 0
+            # join the output directory once; only the number changes per frame
+            filepath_prefix = os.path.join(args.output, "image_")
+            # captures are scheduled on absolute deadlines so capture time
+            # does not accumulate as drift
+            now = time.monotonic
+            next_deadline = now()
+            last_filepath = None  # most recent image handed to the camera
+            retried_filepath = None  # image already captured a second time
             while True:
                 if args.limit > 0 and capture_count >= args.limit:
                     print(f"\nReached image limit ({args.limit}). Stopping capture.")
                     break
 
                 image_number = capture_count + 1
-                filename = f"image_{image_number:05d}.jpg"
-                filepath = os.path.join(args.output, filename)
+                progress = f"{image_number}/{args.limit}" if args.limit > 0 else ""
+                if video_stream is not None:
+                    # frames go straight to ffmpeg, no image file is written
+                    filepath = None
+                    target = f"frame {image_number}"
+                else:
+                    filepath = f"{filepath_prefix}{image_number:05d}.jpg"
+                    target = filepath
 
                 # capture the image
                 try:
-                    print(
-                        f"Capturing image {image_number}{f'/{args.limit}' if args.limit > 0 else ''} to {filepath}..."
-                    )
-                    success = camera.capture_image(filepath)
+                    if video_stream is not None:
+                        log.info("Streaming frame %s...", progress or image_number)
+                        success = video_stream.write_frame(camera.capture_frame())
+                    else:
+                        log.info(
+                            "Capturing image %s to %s...",
+                            progress or image_number,
+                            filepath,
+                        )
+                        success = camera.capture_image(filepath)
                     if success:
                         capture_count += 1
                         images_captured += 1
+                        last_filepath = filepath
                     else:
                         print(
-                            f"Warning: Capture attempt for {filepath} reported failure but didn't raise error."
+                            f"Warning: Capture attempt for {target} reported failure but didn't raise error."
                         )
+                except ImageSaveError as e:
+                    # an earlier image was counted but never reached the disk
+                    print(f"\nError: {e}")
+                    images_captured -= 1
+                    if e.filepath == retried_filepath:
+                        # a gap would cut the compiled video short at this image
+                        print("Saving failed twice, stopping capture.")
+                        break
+                    if e.filepath == last_filepath:
+                        # reuse its number so the image sequence has no gap
+                        capture_count -= 1
+                        last_filepath = None
+                        retried_filepath = e.filepath
+                        print(f"Capturing {e.filepath} again...")
+                    else:
+                        print("Attempting to continue capture...")
                 except CameraError as e:
-                    print(f"\nError during capture for {filepath}: {e}")
+                    print(f"\nError during capture for {target}: {e}")
                     print("Attempting to continue capture...")
-                    time.sleep(args.interval)
-                    continue
+                except VideoError as e:
+                    print(f"\nError while streaming video: {e}")
+                    break
 
                 # Wait for the next interval
                 if args.limit > 0 and capture_count >= args.limit:
                     print(f"\nReached image limit ({args.limit}). Stopping capture.")
                     break
 
-                print(f"Waiting for {args.interval} seconds before next capture...")
+                next_deadline += args.interval
+                sleep_for = next_deadline - now()
+                if sleep_for <= 0:
+                    # capture overran the interval, skip the missed deadline
+                    next_deadline = now()
+                    continue
+
+                log.info("Waiting for %.2f seconds before next capture...", sleep_for)
                 try:
-                    time.sleep(args.interval)
+                    time.sleep(sleep_for)
                 except KeyboardInterrupt:
                     print("\nStopping loop due to Ctrl+C.")
                     break
 
+    except ImageSaveError as e:
+        # the last queued image failed while the camera was shutting down
+        print(f"\nError: {e}")
+        images_captured -= 1
     except CameraError as e:
         print(f"\nCritical Camera Error during setup or loop: {e}")
         sys.exit(1)
@@ -181,19 +288,29 @@ def main():
         print(f"Total duration: {datetime.timedelta(seconds=duration)}")
         print("-" * 30)
 
-        # --- Call video compilation if requested ---
-        if args.compile_video and images_captured > 0:
+        # --- Finish the streamed video or call compilation if requested ---
+        if video_stream is not None:
+            video_stream.close()
+        elif args.compile_video and images_captured > 0:
             print("\nVideo compilation requested.")
             # Define the image pattern based on how files were saved
             image_pattern = "image_%05d.jpg"  # Matches f"image_{image_number:05d}.jpg"
             # Construct the full output video path (can be relative or absolute)
             video_output_path = os.path.join(args.output, args.video_filename)
+            if args.hw_accel == "auto":
+                hw_accel = AUTO_HW_ACCEL.get(current_os)
+            elif args.hw_accel == "none":
+                hw_accel = None
+            else:
+                hw_accel = args.hw_accel
 
             compile_video_ffmpeg(
                 image_folder=args.output,
                 image_pattern=image_pattern,
                 output_filename=video_output_path,
                 fps=args.fps,
+                hw_accel=hw_accel,
+                verbose=args.verbose > 0,
             )
         elif args.compile_video and images_captured == 0:
             print("\nVideo compilation skipped: No images were captured.")
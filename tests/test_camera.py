@@ -0,0 +1,211 @@
+import threading
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+import camera
+from camera import CameraError, ImageSaveError, MacCamera, PiCamera, get_camera
+
+
+class FakeCapture:
+    """Stand-in for cv2.VideoCapture that serves a fixed 4x6 frame."""
+
+    def __init__(self, *args):
+        self.opened = True
+        self.frame = np.full((4, 6, 3), 128, dtype=np.uint8)
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return 6
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return 4
+        return 1
+
+    def grab(self):
+        return self.opened
+
+    def retrieve(self, image=None):
+        if image is None or image.shape != self.frame.shape:
+            image = self.frame.copy()
+        else:
+            np.copyto(image, self.frame)
+        return True, image
+
+    def release(self):
+        self.opened = False
+
+
+@pytest.fixture
+def mac_camera():
+    """A MacCamera backed by FakeCapture with warm-up disabled."""
+    with patch("cv2.VideoCapture", FakeCapture):
+        yield MacCamera({"warm_up_time": 0})
+
+
+def test_mac_camera_saves_queued_images_on_shutdown(mac_camera, tmp_path):
+    """Test that every captured frame is on disk once the camera shuts down."""
+    filepaths = [str(tmp_path / f"image_{n:05d}.jpg") for n in range(1, 4)]
+
+    with mac_camera:
+        for filepath in filepaths:
+            assert mac_camera.capture_image(filepath) is True
+
+    for filepath in filepaths:
+        image = cv2.imread(filepath)
+        assert image is not None
+        assert image.shape == (4, 6, 3)
+
+
+def test_mac_camera_capture_after_shutdown_raises(mac_camera, tmp_path):
+    """Test that capturing on a shut down camera raises CameraError."""
+    with mac_camera:
+        pass
+
+    with pytest.raises(CameraError):
+        mac_camera.capture_image(str(tmp_path / "image_00001.jpg"))
+
+
+def test_mac_camera_drops_frame_when_pool_is_exhausted(mac_camera, tmp_path):
+    """Test that capture fails fast instead of reusing a buffer still in use."""
+    release = threading.Event()
+    encode_jpeg = camera._encode_jpeg
+
+    def slow_encode(frame):
+        release.wait()
+        return encode_jpeg(frame)
+
+    with patch("camera._encode_jpeg", slow_encode), mac_camera:
+        try:
+            for n in range(camera.FRAME_POOL_SIZE):
+                mac_camera.capture_image(str(tmp_path / f"image_{n:05d}.jpg"))
+            with pytest.raises(CameraError):
+                mac_camera.capture_image(str(tmp_path / "dropped.jpg"))
+        finally:
+            release.set()
+
+    assert len(list(tmp_path.glob("image_*.jpg"))) == camera.FRAME_POOL_SIZE
+    assert not (tmp_path / "dropped.jpg").exists()
+
+
+def test_mac_camera_reports_failed_save(mac_camera, tmp_path):
+    """Test that a frame the writer failed to save raises on the next call."""
+    failing = str(tmp_path / "image_00001.jpg")
+    write_file = camera._write_file
+
+    def fail_first(filepath, buf):
+        if filepath == failing:
+            raise OSError(28, "No space left on device")
+        write_file(filepath, buf)
+
+    with patch("camera._write_file", fail_first):
+        with mac_camera:
+            mac_camera.capture_image(failing)
+            mac_camera._write_queue.join()
+            with pytest.raises(ImageSaveError) as e:
+                mac_camera.capture_image(str(tmp_path / "image_00002.jpg"))
+            assert e.value.filepath == failing
+            # the error is reported once, capture then carries on
+            assert mac_camera.capture_image(str(tmp_path / "image_00002.jpg"))
+
+        # a failure while flushing the queue is raised by shutdown
+        with pytest.raises(ImageSaveError):
+            with mac_camera:
+                mac_camera.capture_image(failing)
+
+    assert (tmp_path / "image_00002.jpg").exists()
+    assert mac_camera.capture is None
+
+
+def test_mac_camera_retries_open_with_backoff():
+    """Test that a camera that is busy at first is reopened with backoff."""
+    attempts = []
+
+    def busy_then_free(*args):
+        capture = FakeCapture()
+        attempts.append(capture)
+        capture.opened = len(attempts) == camera.OPEN_ATTEMPTS
+        return capture
+
+    with patch("cv2.VideoCapture", busy_then_free), patch(
+        "camera.time.sleep"
+    ) as mock_sleep:
+        with MacCamera({"warm_up_time": 0}) as mac_camera:
+            assert mac_camera.capture is attempts[-1]
+
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [0.25, 0.5]
+
+
+def test_mac_camera_gives_up_after_open_attempts():
+    """Test that initialize raises CameraError once every attempt has failed."""
+
+    def always_busy(*args):
+        capture = FakeCapture()
+        capture.opened = False
+        return capture
+
+    with patch("cv2.VideoCapture", always_busy), patch("camera.time.sleep"):
+        mac_camera = MacCamera({"warm_up_time": 0})
+        with pytest.raises(CameraError):
+            mac_camera.initialize()
+    assert mac_camera.capture is None
+
+
+@pytest.mark.skipif(
+    not hasattr(camera.os, "sched_setscheduler"), reason="requires sched_setscheduler"
+)
+def test_pi_camera_raises_and_restores_capture_priority():
+    """Test that PiCamera runs capture under SCHED_FIFO and restores it on shutdown."""
+    with patch("camera.os.sched_setscheduler") as mock_setscheduler:
+        with PiCamera():
+            pass
+
+    first, second = mock_setscheduler.call_args_list
+    assert first.args[1] == camera.os.SCHED_FIFO
+    assert second.args[1] == camera.os.sched_getscheduler(0)
+
+
+@pytest.mark.skipif(
+    not hasattr(camera.os, "sched_setscheduler"), reason="requires sched_setscheduler"
+)
+@pytest.mark.parametrize(
+    "error", [PermissionError(1, "Operation not permitted"), OSError(22, "Invalid")]
+)
+def test_pi_camera_continues_without_capture_priority(error):
+    """Test that a refused or invalid real-time priority does not stop the camera."""
+    with patch("camera.os.sched_setscheduler", side_effect=error):
+        with PiCamera() as pi_camera:
+            assert pi_camera._saved_scheduler is None
+
+
+def test_mac_camera_encodes_with_turbojpeg_when_available(mac_camera, tmp_path):
+    """Test that the PyTurboJPEG encoder is preferred over OpenCV when present."""
+    turbojpeg_encode = MagicMock(return_value=b"turbojpeg bytes")
+    filepath = tmp_path / "image_00001.jpg"
+
+    with patch(
+        "camera._get_turbojpeg_encode", return_value=turbojpeg_encode
+    ), mac_camera:
+        mac_camera.capture_image(str(filepath))
+
+    turbojpeg_encode.assert_called_once()
+    assert filepath.read_bytes() == b"turbojpeg bytes"
+
+
+@pytest.mark.parametrize(
+    "os_type, expected_cls", [("macos", MacCamera), ("linux", PiCamera)]
+)
+def test_get_camera_selects_implementation(os_type, expected_cls):
+    """Test that get_camera maps each supported os_type to its camera class."""
+    assert type(get_camera(os_type=os_type)) is expected_cls
+
+
+def test_get_camera_rejects_unknown_os_type():
+    """Test that get_camera raises ValueError for an unknown os_type."""
+    with pytest.raises(ValueError):
+        get_camera(os_type="windows")
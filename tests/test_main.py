@@ -1,9 +1,11 @@
+import contextlib
+import os
 import sys
 import pytest
-from unittest import mock
+import main  # imported once; @patch.object(main, ...) targets its globals
 from main import get_operating_system, parse_arguments
 from unittest.mock import patch, MagicMock
-from camera import MacCamera, PiCamera
+from camera import ImageSaveError, MacCamera, PiCamera, detect_operating_system
 
 
 @pytest.mark.parametrize(
@@ -17,149 +19,290 @@ from camera import MacCamera, PiCamera
         ("freebsd11", "unsupported"),
     ],
 )
-def test_get_operating_system(platform_string, expected_os):
-    """Test the get_operating_system function with different platform strings."""
+def test_detect_operating_system(platform_string, expected_os):
+    """Test the detect_operating_system function with different platform strings."""
+    assert detect_operating_system(platform_string) == expected_os
 
-    with mock.patch.object(sys, "platform", platform_string):
-        assert get_operating_system() == expected_os
 
+def test_get_operating_system():
+    """Test that get_operating_system returns the OS detected for this platform."""
+    assert get_operating_system() == detect_operating_system(sys.platform)
 
-# --- Test parse_arguments function ---
 
+# --- Test parse_arguments function ---
 
-# Test default arguments
-def test_parse_arguments_defaults(monkeypatch):
-    """Test if default arguments are parsed correctly."""
-    monkeypatch.setattr(sys, "argv", ["main.py"])
-    args = parse_arguments()
-    assert args.interval == 10.0
-    assert args.output == "timelapse_output"
-    assert args.limit == 0
-
-
-# Test custom arguments
-def test_parse_arguments_custom(monkeypatch):
-    """Test if custom arguments are parsed correctly."""
-    test_argv = [
-        "main.py",
-        "--interval",
-        "5.5",
-        "--output",
-        "my_images",
-        "--limit",
-        "100",
-    ]
-    monkeypatch.setattr(sys, "argv", test_argv)
-    args = parse_arguments()
-    assert args.interval == 5.5
-    assert args.output == "my_images"
-    assert args.limit == 100
 
+@pytest.mark.parametrize(
+    "argv, expected_or_exc",
+    [
+        # Test default arguments
+        (
+            ["main.py"],
+            {"interval": 10.0, "output": "timelapse_output", "limit": 0},
+        ),
+        # Test custom arguments
+        (
+            ["main.py", "--interval", "5.5", "--output", "my_images", "--limit", "100"],
+            {"interval": 5.5, "output": "my_images", "limit": 100},
+        ),
+        # Test short options
+        (
+            ["main.py", "-i", "2.5", "-o", "short_output", "-l", "50"],
+            {"interval": 2.5, "output": "short_output", "limit": 50},
+        ),
+        # Test invalid arguments
+        (["main.py", "--interval", "not_a_number"], SystemExit),
+    ],
+    ids=["defaults", "custom", "short", "invalid_type"],
+)
+def test_parse_arguments(argv, expected_or_exc, monkeypatch):
+    """Test that arguments are parsed correctly and invalid ones raise an error."""
+    monkeypatch.setattr(sys, "argv", argv)
 
-# Test short options
-def test_parse_arguments_short(monkeypatch):
-    """Test if short options are parsed correctly."""
+    if isinstance(expected_or_exc, type):
+        with pytest.raises(expected_or_exc):
+            parse_arguments()
+        return
 
-    test_argv = ["main.py", "-i", "2.5", "-o", "short_output", "-l", "50"]
-    monkeypatch.setattr(sys, "argv", test_argv)
     args = parse_arguments()
-    assert args.interval == 2.5
-    assert args.output == "short_output"
-    assert args.limit == 50
-
-
-# Test invalid arguments
-def test_parse_arguments_invalid_type(monkeypatch):
-    """Test if invalid arguments raise an error."""
-    test_argv = ["main.py", "--interval", "not_a_number"]
-    monkeypatch.setattr(sys, "argv", test_argv)
-    with pytest.raises(SystemExit):
-        parse_arguments()
+    for name, value in expected_or_exc.items():
+        assert getattr(args, name) == value
 
 
 # --- Tests for camera selection ---
 
 
-@patch("main.get_operating_system", return_value="macos")
-@patch("main.get_camera")  # Mock the factory function *where it's used* in main
-def test_main_uses_correct_camera_on_macos(mock_get_camera, mock_get_os, monkeypatch):
-    """Test if main gets and uses the correct camera instance on macOS."""
-    monkeypatch.setattr(sys, "argv", ["main.py", "-l", "1"])
+@pytest.fixture(scope="session")
+def _camera_specs():
+    """Attribute names of each camera class, introspected once per session."""
+    return {camera_cls: dir(camera_cls) for camera_cls in (MacCamera, PiCamera)}
 
-    # Create a mock camera instance that get_camera will return
-    mock_camera_instance = MagicMock(spec=MacCamera)  # Use spec for better mocking
 
-    # Configure get_camera mock to return our instance
-    mock_get_camera.return_value = mock_camera_instance
+@pytest.fixture
+def make_camera_mock(_camera_specs):
+    """Return a factory for fresh camera mocks that work as context managers."""
 
-    # Configure the __enter__ on our instance to return itself
-    mock_camera_instance.__enter__.return_value = mock_camera_instance
+    def make(camera_cls):
+        # a fresh mock per test keeps call records independent; the cached
+        # name list spares MagicMock from introspecting the class each time
+        mock_camera_instance = MagicMock(spec=_camera_specs[camera_cls])
+        mock_camera_instance.__enter__.return_value = mock_camera_instance
+        # a plain attribute, which MagicMock would otherwise make truthy
+        mock_camera_instance.supports_streaming = camera_cls.supports_streaming
+        return mock_camera_instance
 
-    with patch("os.makedirs", return_value=None), patch(
-        "time.sleep", return_value=None
-    ):
-        # No reload should be needed if we import main late or patch correctly
-        from main import main
+    return make
 
-        main()
 
-    # Assertions
-    mock_get_os.assert_called_once()  # Was OS checked?
-    # Was get_camera called with the correct OS type?
-    mock_get_camera.assert_called_once_with(os_type="macos", config={})
-    # Was the context manager used on our instance?
-    mock_camera_instance.__enter__.assert_called_once()
-    # Was capture called on our instance?
-    mock_camera_instance.capture_image.assert_called_once()
-    # Was the context manager exited (implying shutdown would be called in real code)?
-    mock_camera_instance.__exit__.assert_called_once()
+@pytest.fixture
+def _stub_io():
+    """Keep main from creating the output directory or sleeping between captures."""
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(patch("os.makedirs", return_value=None))
+        stack.enter_context(patch("time.sleep", return_value=None))
+        yield
 
 
-@patch("main.get_operating_system", return_value="linux")
-@patch("main.get_camera")  # Mock the factory function in main
-def test_main_uses_correct_camera_on_linux(mock_get_camera, mock_get_os, monkeypatch):
-    """Test if main gets and uses the correct camera instance on Linux."""
+@pytest.mark.usefixtures("_stub_io")
+@pytest.mark.parametrize(
+    "os_name, spec_cls, should_exit",
+    [
+        ("macos", MacCamera, False),
+        ("linux", PiCamera, False),
+        ("unsupported", None, True),
+    ],
+)
+@patch.object(main, "get_operating_system")
+@patch.object(main, "get_camera")  # Mock the factory function *where it's used* in main
+def test_main_selects_camera_for_os(
+    mock_get_camera,
+    mock_get_os,
+    os_name,
+    spec_cls,
+    should_exit,
+    monkeypatch,
+    make_camera_mock,
+):
+    """Test that main uses the camera for the detected OS, or exits if unsupported."""
     monkeypatch.setattr(sys, "argv", ["main.py", "-l", "1"])
+    mock_get_os.return_value = os_name
 
-    # Create a mock camera instance get_camera will return
-    mock_camera_instance = MagicMock(spec=PiCamera)  # Use spec for better mocking
-
-    # Configure get_camera mock
-    mock_get_camera.return_value = mock_camera_instance
+    if should_exit:
+        with pytest.raises(SystemExit) as e:
+            main.main()
 
-    # Configure __enter__ on our instance
-    mock_camera_instance.__enter__.return_value = mock_camera_instance
+        assert e.value.code == 1  # Check exit code
+        mock_get_os.assert_called_once()  # OS check should still happen
+        mock_get_camera.assert_not_called()  # Ensure we didn't try to get a camera
+        return
 
-    with patch("os.makedirs", return_value=None), patch(
-        "time.sleep", return_value=None
-    ):
-        from main import main
+    # Create a mock camera instance that get_camera will return
+    mock_camera_instance = make_camera_mock(spec_cls)
+    mock_get_camera.return_value = mock_camera_instance
 
-        main()
+    main.main()
 
-    # Assertions
-    mock_get_os.assert_called_once()
-    # Was get_camera called correctly?
-    mock_get_camera.assert_called_once_with(os_type="linux", config={})
-    # Check context manager and capture call
+    mock_get_os.assert_called_once()  # Was OS checked?
+    # Was get_camera called with the correct OS type?
+    mock_get_camera.assert_called_once_with(os_type=os_name, config={})
+    # Was the context manager used and exited on our instance?
     mock_camera_instance.__enter__.assert_called_once()
     mock_camera_instance.capture_image.assert_called_once()
     mock_camera_instance.__exit__.assert_called_once()
 
 
-# Test for unsupported OS (this one should be mostly correct already)
-@patch("main.get_operating_system", return_value="unsupported")
-@patch("main.get_camera")  # Also mock get_camera here
-def test_main_exits_on_unsupported_os(mock_get_camera, mock_get_os, monkeypatch):
-    """Test if main exits cleanly on unsupported OS."""
-    monkeypatch.setattr(sys, "argv", ["main.py"])
+@pytest.mark.usefixtures("_stub_io")
+@patch.object(main, "get_operating_system", return_value="macos")
+@patch.object(main, "get_camera")
+@patch.object(main, "check_ffmpeg", return_value=True)
+@patch.object(main, "VideoStream")
+def test_main_streams_frames_to_ffmpeg(
+    mock_video_stream,
+    mock_check_ffmpeg,
+    mock_get_camera,
+    mock_get_os,
+    monkeypatch,
+    make_camera_mock,
+    capsys,
+):
+    """Test that --stream-video pipes frames to ffmpeg instead of saving images."""
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["main.py", "-l", "2", "--stream-video", "--compile-video", "--hw-accel=auto"],
+    )
+
+    mock_camera_instance = make_camera_mock(MacCamera)
+    mock_get_camera.return_value = mock_camera_instance
+    stream = mock_video_stream.return_value
+    stream.write_frame.return_value = True
+
+    main.main()
+
+    assert mock_camera_instance.capture_frame.call_count == 2
+    mock_camera_instance.capture_image.assert_not_called()
+    stream.write_frame.assert_called_with(
+        mock_camera_instance.capture_frame.return_value
+    )
+    stream.close.assert_called_once()
+    out = capsys.readouterr().out
+    assert "--compile-video is ignored" in out
+    assert "--hw-accel is ignored" in out
+    assert "image_0000" not in out
+
+
+@pytest.mark.usefixtures("_stub_io")
+@patch.object(main, "get_operating_system", return_value="linux")
+@patch.object(main, "get_camera")
+@patch.object(main, "check_ffmpeg", return_value=True)
+@patch.object(main, "VideoStream")
+def test_main_rejects_stream_video_without_camera_support(
+    mock_video_stream,
+    mock_check_ffmpeg,
+    mock_get_camera,
+    mock_get_os,
+    monkeypatch,
+    make_camera_mock,
+):
+    """Test that --stream-video exits before capture if the camera cannot stream."""
+    monkeypatch.setattr(sys, "argv", ["main.py", "-l", "2", "--stream-video"])
+
+    mock_camera_instance = make_camera_mock(PiCamera)
+    mock_get_camera.return_value = mock_camera_instance
 
     with pytest.raises(SystemExit) as e:
-        # Import late to ensure mocks are active
-        from main import main
+        main.main()
+
+    assert e.value.code == 1
+    mock_video_stream.assert_not_called()
+    mock_camera_instance.__enter__.assert_not_called()
+    mock_camera_instance.capture_frame.assert_not_called()
+
+
+@pytest.mark.usefixtures("_stub_io")
+@patch.object(main, "get_operating_system", return_value="macos")
+@patch.object(main, "get_camera")
+def test_main_sleeps_until_next_deadline(
+    mock_get_camera, mock_get_os, monkeypatch, make_camera_mock
+):
+    """Test that capture time is taken out of the sleep and overruns skip it."""
+    monkeypatch.setattr(sys, "argv", ["main.py", "-l", "4", "-i", "10"])
+    clock = [0.0]
+    capture_costs = iter([2.0, 15.0, 1.0, 1.0])
+
+    def capture_image(filepath):
+        clock[0] += next(capture_costs)
+        return True
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    mock_camera_instance = make_camera_mock(MacCamera)
+    mock_camera_instance.capture_image.side_effect = capture_image
+    mock_get_camera.return_value = mock_camera_instance
+
+    with patch.object(main.time, "monotonic", lambda: clock[0]), patch.object(
+        main.time, "sleep", side_effect=sleep
+    ) as mock_sleep:
+        main.main()
+
+    assert mock_camera_instance.capture_image.call_count == 4
+    # 10 - 2 after the first capture; the 15 second capture overran its slot
+    # so no sleep; then 10 - 1 from the rescheduled deadline
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [8.0, 9.0]
+
+
+@pytest.mark.usefixtures("_stub_io")
+@patch.object(main, "get_operating_system", return_value="macos")
+@patch.object(main, "get_camera")
+def test_main_recaptures_image_that_failed_to_save(
+    mock_get_camera, mock_get_os, monkeypatch, make_camera_mock, capsys
+):
+    """Test that an image the camera could not save is captured again."""
+    monkeypatch.setattr(sys, "argv", ["main.py", "-l", "3", "-o", "out"])
+    failed = os.path.join("out", "image_00002.jpg")
+
+    mock_camera_instance = make_camera_mock(MacCamera)
+    mock_camera_instance.capture_image.side_effect = [
+        True,
+        True,
+        ImageSaveError(f"Error saving image to {failed}: disk full", failed),
+        True,
+        True,
+    ]
+    mock_get_camera.return_value = mock_camera_instance
+
+    main.main()
+
+    filepaths = [c.args[0] for c in mock_camera_instance.capture_image.call_args_list]
+    assert [os.path.basename(path) for path in filepaths] == [
+        "image_00001.jpg",
+        "image_00002.jpg",
+        "image_00003.jpg",
+        "image_00002.jpg",
+        "image_00003.jpg",
+    ]
+    assert "Total images captured: 3" in capsys.readouterr().out
+
+
+@pytest.mark.usefixtures("_stub_io")
+@patch.object(main, "get_operating_system", return_value="macos")
+@patch.object(main, "get_camera")
+def test_main_stops_when_image_fails_to_save_twice(
+    mock_get_camera, mock_get_os, monkeypatch, make_camera_mock, capsys
+):
+    """Test that an image which cannot be saved on retry stops the capture."""
+    monkeypatch.setattr(sys, "argv", ["main.py", "-l", "5", "-o", "out"])
+    failed = os.path.join("out", "image_00002.jpg")
+    error = ImageSaveError(f"Error saving image to {failed}: is a directory", failed)
+
+    mock_camera_instance = make_camera_mock(MacCamera)
+    mock_camera_instance.capture_image.side_effect = [True, True, error, True, error]
+    mock_get_camera.return_value = mock_camera_instance
 
-        main()
+    main.main()
 
-    assert e.value.code == 1  # Check exit code
-    mock_get_os.assert_called_once()  # OS check should still happen
-    mock_get_camera.assert_not_called()  # Ensure we didn't try to get a camera
+    assert mock_camera_instance.capture_image.call_count == 5
+    out = capsys.readouterr().out
+    assert "stopping capture" in out
+    assert "Total images captured: 1" in out
@@ -0,0 +1,328 @@
+import os
+import sys
+import numpy as np
+import pytest
+import video_utils
+from video_utils import (
+    VideoStream,
+    compile_video_async,
+    compile_video_ffmpeg,
+    compile_video_stream,
+)
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="fake ffmpeg is a POSIX shell script"
+)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Put a fake ffmpeg on PATH; yields a function that sets its behaviour."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ffmpeg"
+    monkeypatch.setenv("PATH", str(bin_dir), prepend=os.pathsep)
+    monkeypatch.setattr(video_utils, "_HW_ENCODERS", None)
+    monkeypatch.setattr(video_utils, "_FFMPEG_VERSION", None)
+    video_utils._ffmpeg_path.cache_clear()
+
+    def install(stderr="", returncode=0, encoders="", failing_encoder="none"):
+        script.write_text(
+            "#!/bin/sh\n"
+            'if [ "$1" = "-version" ]; then\n'
+            "  echo 'ffmpeg version fake'\n"
+            "  exit 0\n"
+            "fi\n"
+            'if [ "$2" = "-encoders" ]; then\n'
+            f"  printf '%s\\n' '{encoders}'\n"
+            "  exit 0\n"
+            "fi\n"
+            f'echo "$@" >> "{tmp_path / "args.txt"}"\n'
+            # keep a copy of the input: a concat list file, which is deleted
+            # afterwards, or whatever was piped to stdin
+            'prev=""; for arg in "$@"; do\n'
+            '  if [ "$prev" = "-i" ]; then\n'
+            f'    if [ "$arg" = "-" ]; then cat > "{tmp_path / "input.txt"}"\n'
+            f'    else cp "$arg" "{tmp_path / "input.txt"}" 2>/dev/null; fi\n'
+            "  fi\n"
+            '  prev="$arg"\n'
+            "done\n"
+            # write something to the output file, the last argument
+            'for out in "$@"; do :; done\n'
+            "printf 'video' > \"$out\"\n"
+            f"printf '%s' '{stderr}' >&2\n"
+            f'case "$*" in *{failing_encoder}*) exit 1;; esac\n'
+            f"exit {returncode}\n"
+        )
+        script.chmod(0o755)
+        return tmp_path / "args.txt"
+
+    yield install
+    # the PATH lookup was cached against the fake ffmpeg
+    video_utils._ffmpeg_path.cache_clear()
+
+
+@pytest.mark.parametrize("verbose", [False, True])
+def test_compile_video_ffmpeg_relays_ffmpeg_output_when_verbose(
+    fake_ffmpeg, tmp_path, capsys, verbose
+):
+    """Test that a successful encode echoes ffmpeg's stderr only when verbose."""
+    fake_ffmpeg(stderr="frame=  42 fps=0.0")
+
+    assert compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", str(tmp_path / "out.mp4"), 24, verbose=verbose
+    )
+    assert ("frame=  42" in capsys.readouterr().out) is verbose
+
+
+def test_compile_video_ffmpeg_reports_failure(fake_ffmpeg, tmp_path, capsys):
+    """Test that a failed encode returns False and shows ffmpeg's stderr."""
+    fake_ffmpeg(stderr="No such file", returncode=1)
+
+    assert not compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", str(tmp_path / "out.mp4"), 24
+    )
+    assert "No such file" in capsys.readouterr().out
+
+
+def test_compile_video_ffmpeg_passes_encoder_settings(fake_ffmpeg, tmp_path):
+    """Test that preset, CRF, tune and thread settings reach the ffmpeg command."""
+    args_file = fake_ffmpeg()
+
+    compile_video_ffmpeg(
+        str(tmp_path),
+        "image_%05d.jpg",
+        str(tmp_path / "out.mp4"),
+        30,
+        preset="veryfast",
+        crf=20,
+    )
+
+    args = args_file.read_text().split()
+    assert args[args.index("-preset") + 1] == "veryfast"
+    assert args[args.index("-crf") + 1] == "20"
+    assert args[args.index("-tune") + 1] == "stillimage"
+    assert args[args.index("-threads") + 1] == "0"
+
+
+def test_compile_video_ffmpeg_uses_available_hw_encoder(fake_ffmpeg, tmp_path):
+    """Test that a hardware encoder listed by ffmpeg replaces libx264."""
+    args_file = fake_ffmpeg(encoders=" V....D h264_nvenc  NVIDIA NVENC H.264")
+
+    assert compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", str(tmp_path / "out.mp4"), 24, hw_accel="nvenc"
+    )
+
+    args = args_file.read_text().split()
+    assert args[args.index("-c:v") + 1] == "h264_nvenc"
+
+
+def test_compile_video_ffmpeg_maps_crf_to_videotoolbox_quality(fake_ffmpeg, tmp_path):
+    """Test that crf is translated to VideoToolbox's -q:v scale."""
+    args_file = fake_ffmpeg(encoders=" V....D h264_videotoolbox  VideoToolbox H.264")
+
+    compile_video_ffmpeg(
+        str(tmp_path),
+        "image_%05d.jpg",
+        str(tmp_path / "out.mp4"),
+        24,
+        crf=18,
+        hw_accel="videotoolbox",
+        outputs=[(str(tmp_path / "small.mp4"), {"crf": 23})],
+    )
+
+    args = args_file.read_text().split()
+    assert [args[i + 1] for i, a in enumerate(args) if a == "-q:v"] == ["78", "65"]
+
+
+def test_compile_video_ffmpeg_falls_back_to_libx264(fake_ffmpeg, tmp_path):
+    """Test that a failing hardware encode is retried with libx264."""
+    args_file = fake_ffmpeg(
+        encoders=" V....D h264_nvenc  NVIDIA NVENC H.264", failing_encoder="h264_nvenc"
+    )
+
+    assert compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", str(tmp_path / "out.mp4"), 24, hw_accel="nvenc"
+    )
+
+    hw_run, sw_run = args_file.read_text().splitlines()
+    assert "h264_nvenc" in hw_run
+    assert "libx264" in sw_run
+
+
+def test_compile_video_ffmpeg_skips_missing_hw_encoder(fake_ffmpeg, tmp_path):
+    """Test that libx264 is used when ffmpeg lacks the requested encoder."""
+    args_file = fake_ffmpeg(encoders=" V....D libx264  libx264 H.264")
+
+    compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", str(tmp_path / "out.mp4"), 24, hw_accel="vaapi"
+    )
+
+    args = args_file.read_text().split()
+    assert "-vaapi_device" not in args
+    assert args[args.index("-c:v") + 1] == "libx264"
+
+
+def test_compile_video_ffmpeg_concat_list(fake_ffmpeg, tmp_path):
+    """Test that image_paths are compiled through a concat list with durations."""
+    args_file = fake_ffmpeg()
+    image_paths = [str(tmp_path / "b.jpg"), str(tmp_path / "it's.jpg")]
+
+    assert compile_video_ffmpeg(
+        None, None, str(tmp_path / "out.mp4"), 4, image_paths=image_paths
+    )
+
+    args = args_file.read_text().split()
+    assert args[args.index("-f") + 1] == "concat"
+    list_path = args[args.index("-i") + 1]
+    assert not os.path.exists(list_path)
+    assert (tmp_path / "input.txt").read_text().splitlines() == [
+        f"file '{tmp_path}/b.jpg'",
+        "duration 0.25",
+        f"file '{tmp_path}/it'\\''s.jpg'",
+        "duration 0.25",
+        f"file '{tmp_path}/it'\\''s.jpg'",
+    ]
+
+
+def test_check_ffmpeg_caches_path_lookup(fake_ffmpeg, tmp_path, monkeypatch):
+    """Test that ffmpeg is looked up on PATH only once and run by absolute path."""
+    args_file = fake_ffmpeg()
+    assert video_utils.check_ffmpeg()
+    assert video_utils._ffmpeg_path() == str(tmp_path / "bin" / "ffmpeg")
+
+    monkeypatch.setattr("shutil.which", lambda name: None)
+    assert video_utils.check_ffmpeg()
+
+    # the cached path is run even with ffmpeg no longer on PATH
+    monkeypatch.setenv("PATH", "")
+    assert compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", str(tmp_path / "out.mp4"), 24
+    )
+    assert args_file.exists()
+
+
+def test_compile_video_stream_pipes_images(fake_ffmpeg, tmp_path):
+    """Test that in-memory images are written to ffmpeg's stdin via image2pipe."""
+    args_file = fake_ffmpeg()
+
+    assert compile_video_stream(
+        iter([b"jpeg one", b"jpeg two"]), str(tmp_path / "out.mp4"), 24
+    )
+
+    args = args_file.read_text().split()
+    assert args[args.index("-f") + 1] == "image2pipe"
+    assert args[args.index("-i") + 1] == "-"
+    assert (tmp_path / "input.txt").read_bytes() == b"jpeg onejpeg two"
+
+
+@pytest.mark.parametrize("verbose", [False, True])
+def test_compile_video_ffmpeg_prints_command_only_when_verbose(
+    fake_ffmpeg, tmp_path, capsys, verbose
+):
+    """Test that the shell-quoted ffmpeg command is printed only in verbose mode."""
+    fake_ffmpeg()
+    output_filename = str(tmp_path / "my video.mp4")
+
+    compile_video_ffmpeg(
+        str(tmp_path), "image_%05d.jpg", output_filename, 24, verbose=verbose
+    )
+
+    out = capsys.readouterr().out
+    assert ("Running command: " in out) is verbose
+    assert (f"'{output_filename}'" in out) is verbose
+
+
+def test_compile_video_ffmpeg_reuses_cached_encode(fake_ffmpeg, tmp_path, monkeypatch):
+    """Test that an unchanged image folder is not encoded a second time."""
+    args_file = fake_ffmpeg()
+    monkeypatch.setattr(video_utils, "ENCODE_CACHE_DIR", str(tmp_path / "cache"))
+    image_folder = tmp_path / "images"
+    image_folder.mkdir()
+    (image_folder / "image_00001.jpg").write_bytes(b"jpeg")
+
+    for name in ("first.mp4", "second.mp4"):
+        assert compile_video_ffmpeg(
+            str(image_folder), "image_%05d.jpg", str(tmp_path / name), 24, cache=True
+        )
+    assert len(args_file.read_text().splitlines()) == 1
+    assert (tmp_path / "second.mp4").read_bytes() == b"video"
+
+    # a changed image misses the cache
+    (image_folder / "image_00001.jpg").write_bytes(b"new jpeg")
+    compile_video_ffmpeg(
+        str(image_folder), "image_%05d.jpg", str(tmp_path / "third.mp4"), 24, cache=True
+    )
+    assert len(args_file.read_text().splitlines()) == 2
+
+
+def test_compile_video_async_encodes_images_as_they_arrive(fake_ffmpeg, tmp_path):
+    """Test that the returned ffmpeg process takes images until stdin is closed."""
+    fake_ffmpeg()
+
+    process = compile_video_async(str(tmp_path / "out.mp4"), 24)
+    for image_bytes in (b"jpeg one", b"jpeg two"):
+        process.stdin.write(image_bytes)
+    process.stdin.close()
+
+    assert process.wait() == 0
+    assert (tmp_path / "input.txt").read_bytes() == b"jpeg onejpeg two"
+
+
+def test_compile_video_ffmpeg_encodes_extra_outputs_in_one_run(fake_ffmpeg, tmp_path):
+    """Test that extra outputs are added to the same ffmpeg command."""
+    args_file = fake_ffmpeg()
+    small = str(tmp_path / "small.mp4")
+
+    assert compile_video_ffmpeg(
+        str(tmp_path),
+        "image_%05d.jpg",
+        str(tmp_path / "out.mp4"),
+        24,
+        outputs=[(small, {"size": "640x360", "crf": 28})],
+    )
+
+    (run,) = args_file.read_text().splitlines()
+    args = run.split()
+    assert args.count("-map") == 2
+    assert [args[i + 1] for i, a in enumerate(args) if a == "-crf"] == ["23", "28"]
+    assert args[args.index("-s") + 1] == "640x360"
+    assert args[-1] == small
+
+
+def test_video_stream_uses_shared_encoder_settings(fake_ffmpeg, tmp_path, capsys):
+    """Test that streamed frames are encoded with the same x264 settings."""
+    args_file = fake_ffmpeg()
+    frame = np.zeros((4, 6, 3), dtype=np.uint8)
+
+    stream = VideoStream(str(tmp_path / "out.mp4"), 24, crf=20)
+    assert stream.write_frame(frame)
+    assert stream.close()
+
+    args = args_file.read_text().split()
+    assert args[args.index("-s") + 1] == "6x4"
+    assert args[args.index("-crf") + 1] == "20"
+    assert args[args.index("-tune") + 1] == "stillimage"
+    assert args[args.index("-movflags") + 1] == "+faststart"
+    assert (tmp_path / "input.txt").read_bytes() == frame.tobytes()
+    assert "Running command" not in capsys.readouterr().out
+
+
+def test_compile_video_ffmpeg_cache_ignores_video_in_image_folder(
+    fake_ffmpeg, tmp_path, monkeypatch
+):
+    """Test that a video saved next to the images does not defeat the cache."""
+    args_file = fake_ffmpeg()
+    monkeypatch.setattr(video_utils, "ENCODE_CACHE_DIR", str(tmp_path / "cache"))
+    image_folder = tmp_path / "images"
+    image_folder.mkdir()
+    (image_folder / "image_00001.jpg").write_bytes(b"jpeg")
+    output_filename = str(image_folder / "timelapse.mp4")
+
+    for _ in range(3):
+        assert compile_video_ffmpeg(
+            str(image_folder), "image_%05d.jpg", output_filename, 24, cache=True
+        )
+
+    assert len(args_file.read_text().splitlines()) == 1
+    assert len(list((tmp_path / "cache").iterdir())) == 1
@@ -1,27 +1,342 @@
-import subprocess
-import shutil
+import functools
 import os
+import sys
+
+# Pipe buffer for ffmpeg's stderr, large enough to never stall the encoder
+FFMPEG_PIPE_BUFSIZE = 1 << 20
+# Bytes of ffmpeg's stderr kept to show when a quiet encode fails
+FFMPEG_ERROR_TAIL = 1 << 16
+
+# ffmpeg encoder behind each hw_accel option of compile_video_ffmpeg
+HW_ENCODERS = {
+    "nvenc": "h264_nvenc",  # NVIDIA GPUs (Linux/Windows)
+    "vaapi": "h264_vaapi",  # Intel/AMD GPUs on Linux
+    "videotoolbox": "h264_videotoolbox",  # macOS
+}
+# Hardware encoder to try for each operating system when hw_accel is 'auto'
+AUTO_HW_ACCEL = {"macos": "videotoolbox", "linux": "vaapi"}
+# Render node used for VAAPI encoding
+VAAPI_DEVICE = "/dev/dri/renderD128"
+
+# Where compile_video_ffmpeg(cache=True) keeps previously encoded videos
+ENCODE_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "pytimelapse",
+)
+
+# Encoders supported by the installed ffmpeg, probed once on first use
+_HW_ENCODERS = None
+# First line of 'ffmpeg -version', probed once on first use
+_FFMPEG_VERSION = None
+
+
+class VideoError(Exception):
+    """Custom exception for video encoding errors."""
+
+    pass
+
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_path():
+    """
+    Returns the absolute path of ffmpeg on the system PATH, or None.
+
+    The PATH lookup is done once per process and every command runs this
+    path, so exec does not search PATH again; call _ffmpeg_path.cache_clear()
+    after changing PATH to look again.
+    """
+    import shutil
+
+    return shutil.which("ffmpeg")
 
 
 def check_ffmpeg():
     """Checks if ffmpeg command exists in the system PATH."""
-    return shutil.which("ffmpeg") is not None
+    return _ffmpeg_path() is not None
+
 
+def _available_encoders():
+    """Returns the set of encoder names the installed ffmpeg supports."""
+    global _HW_ENCODERS
+    import subprocess
+
+    if _HW_ENCODERS is None:
+        try:
+            result = subprocess.run(
+                # a missing ffmpeg falls through to the OSError below
+                [_ffmpeg_path() or "ffmpeg", "-hide_banner", "-encoders"],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                check=False,
+            )
+            # encoder lines look like ' V....D h264_nvenc  NVIDIA NVENC ...';
+            # only the names are decoded, not the whole listing
+            _HW_ENCODERS = {
+                fields[1].decode()
+                for fields in map(bytes.split, result.stdout.splitlines())
+                if len(fields) > 1
+            }
+        except OSError:
+            _HW_ENCODERS = set()
+    return _HW_ENCODERS
+
+
+def _ffmpeg_version():
+    """Returns the installed ffmpeg's version line as bytes, b'' if it cannot run."""
+    global _FFMPEG_VERSION
+    import subprocess
+
+    if _FFMPEG_VERSION is None:
+        try:
+            result = subprocess.run(
+                [_ffmpeg_path() or "ffmpeg", "-version"],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                check=False,
+            )
+            _FFMPEG_VERSION = result.stdout.partition(b"\n")[0]
+        except OSError:
+            _FFMPEG_VERSION = b""
+    return _FFMPEG_VERSION
 
-def compile_video_ffmpeg(image_folder, image_pattern, output_filename, fps):
+
+def _pattern_regex(image_pattern):
+    """Returns a regex matching the file names of an image2 pattern."""
+    import re
+
+    parts = []
+    for part in re.split(r"(%%|%0?\d*d)", image_pattern):
+        if part == "%%":
+            parts.append("%")
+        elif part.startswith("%"):
+            parts.append(r"\d+")  # %d or %05d, the frame number
+        else:
+            parts.append(re.escape(part))
+    return re.compile("".join(parts))
+
+
+def _encode_cache_path(
+    image_folder, image_pattern, image_paths, output_filename, settings
+):
+    """
+    Returns where the video for these inputs and settings is cached.
+
+    The key covers each input image's name, size and modification time, the
+    encode settings and the ffmpeg version, so changing any of them misses.
+    Only files in image_folder matching image_pattern count as inputs, so a
+    video written next to the images does not change the key.
+    Returns None if the inputs cannot be listed.
+    """
+    import hashlib
+
+    key = hashlib.blake2b(digest_size=16)
+    key.update(repr(settings).encode())
+    key.update(_ffmpeg_version())
+    try:
+        if image_paths is not None:
+            inputs = [(path, os.stat(path)) for path in image_paths]
+        else:
+            name_re = _pattern_regex(image_pattern)
+            output_path = os.path.abspath(output_filename)
+            with os.scandir(image_folder) as entries:
+                inputs = sorted(
+                    (entry.name, entry.stat())
+                    for entry in entries
+                    if name_re.fullmatch(entry.name)
+                    and os.path.abspath(entry.path) != output_path
+                )
+    except OSError:
+        return None
+    for name, st in inputs:
+        key.update(f"{name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    extension = os.path.splitext(output_filename)[1]
+    return os.path.join(ENCODE_CACHE_DIR, key.hexdigest() + extension)
+
+
+def _store_in_cache(output_filename, cache_path):
+    """Copies a freshly encoded video into the encode cache."""
+    import shutil
+
+    try:
+        os.makedirs(ENCODE_CACHE_DIR, exist_ok=True)
+        # copy under a temporary name first so a reader never sees half a file
+        partial_path = f"{cache_path}.{os.getpid()}.part"
+        shutil.copyfile(output_filename, partial_path)
+        os.replace(partial_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not store video in the encode cache: {e}")
+
+
+def _encoder_args(hw_accel, preset, crf, tune, threads):
+    """Returns the ffmpeg output options for the selected encoder."""
+    if hw_accel == "nvenc":
+        # p1 (fastest) .. p7 (best); -cq is the constant-quality analogue of CRF
+        return ["-c:v", "h264_nvenc", "-preset", "p4", "-cq", str(crf)]
+    elif hw_accel == "vaapi":
+        # frames must be uploaded to the GPU in a format it can encode
+        return ["-vf", "format=nv12,hwupload", "-c:v", "h264_vaapi", "-qp", str(crf)]
+    elif hw_accel == "videotoolbox":
+        # -q:v runs 1-100 (higher is better); 65 is close to x264 at CRF 23
+        # and each CRF step is roughly 2.5 q:v steps. Intel Macs reject
+        # constant quality, so there the encode fails and libx264 is used
+        quality = max(1, min(100, round(65 + (23 - crf) * 2.5)))
+        return [
+            "-c:v",
+            "h264_videotoolbox",
+            "-q:v",
+            str(quality),
+            "-pix_fmt",
+            "yuv420p",
+        ]
+    return [
+        "-threads",
+        str(threads),  # 0 = one encoder thread per core
+        "-tune",
+        tune,
+        "-c:v",
+        "libx264",  # Video codec H.264 (widely compatible)
+        "-pix_fmt",
+        "yuv420p",  # Pixel format for compatibility
+        "-crf",
+        str(crf),  # Constant Rate Factor (lower is better quality, 18-28 is common)
+        "-preset",
+        preset,  # Encoding speed vs compression, see compile_video_ffmpeg
+    ]
+
+
+def _run_ffmpeg(command, verbose=False):
+    """
+    Runs an ffmpeg command. Returns the exit code.
+
+    With verbose, ffmpeg's output is relayed live. Otherwise only the last
+    FFMPEG_ERROR_TAIL bytes are kept, and printed if ffmpeg fails.
+    """
+    import subprocess
+
+    process = subprocess.Popen(
+        command,
+        # ffmpeg reads stdin for interactive keys ('q' to quit); with an
+        # inherited stdin it can block or steal input from our caller
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        bufsize=FFMPEG_PIPE_BUFSIZE,
+    )
+
+    # Read ffmpeg's progress/info (written to stderr) as it arrives, in
+    # chunks rather than lines since progress updates end in '\r', and
+    # as raw bytes to skip decoding output that is only echoed
+    if verbose:
+        print("\n--- ffmpeg stderr ---")
+        sys.stdout.flush()
+    tail = bytearray()
+    with process.stderr:
+        for chunk in iter(lambda: process.stderr.read1(FFMPEG_PIPE_BUFSIZE), b""):
+            if verbose:
+                sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+            else:
+                tail += chunk
+                del tail[:-FFMPEG_ERROR_TAIL]
+    returncode = process.wait()
+
+    if returncode != 0 and not verbose:
+        print("\n--- ffmpeg stderr ---")
+        sys.stdout.flush()
+        sys.stdout.buffer.write(tail)
+        sys.stdout.buffer.flush()
+    return returncode
+
+
+def _write_concat_list(image_paths, fps):
+    """Writes an ffmpeg concat demuxer list showing each image for 1/fps seconds."""
+    import tempfile
+
+    duration = 1 / fps
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        for path in image_paths:
+            # single quotes are escaped as '\'' inside a quoted concat path
+            entry = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{entry}'\nduration {duration}\n")
+        # the last duration only applies if the final file is listed again
+        list_file.write(f"file '{entry}'\n")
+    return list_file.name
+
+
+def _ensure_output_dir(output_filename):
+    """Creates the directory for output_filename if needed. Returns False on error."""
+    video_output_dir = os.path.dirname(output_filename)
+    if video_output_dir:
+        try:
+            os.makedirs(video_output_dir, exist_ok=True)
+        except OSError as e:
+            print(
+                f"Error creating directory for video output '{video_output_dir}': {e}"
+            )
+            return False
+    return True
+
+
+def compile_video_ffmpeg(
+    image_folder,
+    image_pattern,
+    output_filename,
+    fps,
+    preset="ultrafast",
+    crf=23,
+    tune="stillimage",
+    threads=0,
+    hw_accel=None,
+    image_paths=None,
+    verbose=False,
+    cache=False,
+    outputs=None,
+):
     """
     Compiles images into a video using ffmpeg.
 
+    Encoding is the most CPU-heavy step of the tool. The x264 preset trades
+    encode speed for file size: ultrafast, superfast, veryfast, faster, fast,
+    medium, slow, slower, veryslow. Each step down the list is roughly 1.5-2x
+    slower for a somewhat smaller file at the same CRF. 'ultrafast' is the
+    default because timelapses are usually re-encoded for sharing anyway.
+
     Args:
         image_folder (str) : Path to the folder containing images.
         image_pattern (str) : Filename pattern (e.g., 'image_%05d.jpg').
         output_filename (str) : Path for the output video file.
-        fpg (int) : Framerate for the output video.
+        fps (int) : Framerate for the output video.
+        preset (str) : x264 preset, see above (default: 'ultrafast').
+        crf (int) : Constant Rate Factor, lower means better quality (default: 23).
+        tune (str) : x264 tuning; 'stillimage' suits mostly static scenes.
+        threads (int) : Encoder threads, 0 lets x264 use all cores (default: 0).
+        hw_accel (str) : Hardware encoder to use instead of x264: 'nvenc',
+            'vaapi' or 'videotoolbox' (default: None). Falls back to x264 if
+            ffmpeg lacks the encoder or the hardware encode fails. crf is
+            mapped to each encoder's quality scale; preset only applies to x264.
+        image_paths (list[str]) : Explicit list of images to use instead of
+            image_folder/image_pattern (default: None). Passed to ffmpeg's
+            concat demuxer, so names need not be sequential and ffmpeg does
+            not probe the folder for each frame number.
+        verbose (bool) : Print the compile settings and the ffmpeg command
+            line before running it (default: False).
+        cache (bool) : Reuse the video from an earlier call with the same
+            images and settings, kept in ENCODE_CACHE_DIR, instead of encoding
+            again (default: False). Not used when outputs are given.
+        outputs (list[tuple[str, dict]]) : Extra videos to encode in the same
+            ffmpeg run, so the images are decoded only once (default: None).
+            Each entry is (output path, options); the options 'size' (e.g.
+            '1280x720') and 'crf' override those of output_filename.
 
     Returns:
         bool: True if compilation succeeded, False otherwise.
     """
 
+    if hw_accel is not None and hw_accel not in HW_ENCODERS:
+        raise ValueError(
+            f"Invalid hw_accel specified: {hw_accel}. Supported values are {', '.join(HW_ENCODERS)}."
+        )
+
     if not check_ffmpeg():
         print("Error: ffmpeg command not found. Cannot compile video.")
         print(
@@ -29,67 +344,360 @@ def compile_video_ffmpeg(image_folder, image_pattern, output_filename, fps):
         )
         return False
 
+    if image_paths is not None and not image_paths:
+        print("Error: No images were given to compile.")
+        return False
+
     print("\nAttempting to compile video using ffmpeg...")
-    print(f"  Image Source: {os.path.join(image_folder, image_pattern)}")
-    print(f"  Output Video: {output_filename}")
-    print(f"  Framerate: {fps}")
+    if verbose:
+        if image_paths is not None:
+            image_source = f"{len(image_paths)} listed images"
+        else:
+            image_source = os.path.join(image_folder, image_pattern)
+        print(f"  Image Source: {image_source}")
+        print(f"  Output Video: {output_filename}")
+        print(f"  Framerate: {fps}")
+
+    outputs = [(output_filename, {})] + list(outputs or [])
+
+    # Ensure output directory exists for every video file
+    for path, _ in outputs:
+        if not _ensure_output_dir(path):
+            return False
+
+    cache_path = None
+    if cache and len(outputs) == 1:
+        settings = (image_pattern, fps, preset, crf, tune, threads, hw_accel)
+        cache_path = _encode_cache_path(
+            image_folder, image_pattern, image_paths, output_filename, settings
+        )
+    if cache_path is not None and os.path.exists(cache_path):
+        import shutil
 
-    # Ensure output directory exists for the video file
-    video_output_dir = os.path.dirname(output_filename)
-    if video_output_dir and not os.path.exists(video_output_dir):
         try:
-            os.makedirs(video_output_dir)
-            print(f"Created directory for video output: {video_output_dir}")
-        except OSError as e:
+            shutil.copyfile(cache_path, output_filename)
             print(
-                f"Error creating directory for video output '{video_output_dir}': {e}"
+                f"\nVideo compilation skipped, reused cached video: {output_filename}"
             )
+            return True
+        except OSError as e:
+            print(f"Warning: Could not reuse cached video, encoding again: {e}")
+
+    if hw_accel is not None and HW_ENCODERS[hw_accel] not in _available_encoders():
+        print(f"Warning: ffmpeg has no {HW_ENCODERS[hw_accel]} encoder, using libx264.")
+        hw_accel = None
+
+    list_file = None
+    try:
+        if image_paths is not None:
+            list_file = _write_concat_list(image_paths, fps)
+            input_args = ["-f", "concat", "-safe", "0", "-i", list_file]
+            # keep the per-image durations from the list instead of resampling
+            input_args += ["-vsync", "vfr"]
+        else:
+            input_args = [
+                "-framerate",
+                str(fps),
+                "-i",
+                os.path.join(image_folder, image_pattern),  # Input pattern
+            ]
+
+        # the hardware encoder can be built in without usable hardware behind
+        # it, so libx264 is always the last resort
+        for encoder in [hw_accel, None] if hw_accel is not None else [None]:
+            command = [_ffmpeg_path(), "-y"]
+            if encoder == "vaapi":
+                command += ["-vaapi_device", VAAPI_DEVICE]
+            command += input_args
+            # every output maps the one decoded input stream
+            for path, options in outputs:
+                if len(outputs) > 1:
+                    command += ["-map", "0:v"]
+                command += _encoder_args(
+                    encoder, preset, options.get("crf", crf), tune, threads
+                )
+                if "size" in options:
+                    command += ["-s", options["size"]]
+                command += [
+                    "-movflags",
+                    "+faststart",  # Put the index first so players can start immediately
+                    path,  # Output file path
+                ]
+
+            if verbose:
+                import shlex
+
+                # shlex.join quotes paths with spaces so the line can be rerun
+                print(f"Running command: {shlex.join(command)}")
+            returncode = _run_ffmpeg(command, verbose)
+            if returncode == 0:
+                break
+            if encoder is not None:
+                print(
+                    f"\nWarning: {HW_ENCODERS[encoder]} encoding failed, retrying with libx264."
+                )
+
+        if returncode != 0:
+            print(f"\nError: ffmpeg compilation failed with return code {returncode}.")
             return False
+        else:
+            for path, _ in outputs:
+                print(f"\nVideo compilation successful: {path}")
+            if cache_path is not None:
+                _store_in_cache(output_filename, cache_path)
+            return True
+
+    except FileNotFoundError:
+        # This should theoretically be caught by check_ffmpeg, but as fallback
+        print("Error: ffmpeg command not found. Cannot compile video.")
+        return False
+    except Exception as e:
+        print(f"An unexpected error occurred during ffmpeg execution: {e}")
+        return False
+    finally:
+        if list_file is not None:
+            os.unlink(list_file)
+
+
+def compile_video_async(
+    output_filename,
+    fps,
+    preset="ultrafast",
+    crf=23,
+    tune="stillimage",
+    threads=0,
+    verbose=False,
+):
+    """
+    Starts ffmpeg encoding images piped to its stdin and returns immediately.
+
+    The caller writes each encoded image (JPEG, PNG, ...) to process.stdin as
+    it becomes available, e.g. right after each capture, so ffmpeg encodes
+    while the capture loop waits for the next interval. Closing stdin ends
+    the video; process.wait() then returns ffmpeg's exit code, and
+    process.poll() checks on it without blocking.
+
+    Args:
+        output_filename (str) : Path for the output video file.
+        fps (int) : Framerate for the output video.
+        preset (str) : x264 preset, see compile_video_ffmpeg (default: 'ultrafast').
+        crf (int) : Constant Rate Factor, lower means better quality (default: 23).
+        tune (str) : x264 tuning; 'stillimage' suits mostly static scenes.
+        threads (int) : Encoder threads, 0 lets x264 use all cores (default: 0).
+        verbose (bool) : Print the ffmpeg command line (default: False).
+
+    Returns:
+        subprocess.Popen: The running ffmpeg process.
+
+    Raises:
+        VideoError: If ffmpeg is missing or could not be started.
+    """
+    import subprocess
+
+    if not check_ffmpeg():
+        raise VideoError("ffmpeg command not found. Cannot compile video.")
+
+    if not _ensure_output_dir(output_filename):
+        raise VideoError(f"Cannot create output directory for {output_filename}")
 
     command = [
-        "ffmpeg",
+        _ffmpeg_path(),
         "-y",
+        "-loglevel",
+        "error",  # progress lines would interleave with our own output
+        "-f",
+        "image2pipe",
         "-framerate",
         str(fps),
         "-i",
-        os.path.join(image_folder, image_pattern),  # Input pattern
-        "-c:v",
-        "libx264",  # Video codec H.264 (widely compatible)
-        "-pix_fmt",
-        "yuv420p",  # Pixel format for compatibility
-        "-crf",
-        "23",  # Constant Rate Factor (lower means better quality, 18-28 is common range)
-        "-preset",
-        "medium",  # Encoding speed vs compression (ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow)
-        output_filename,  # Output file path
+        "-",  # images arrive on stdin
     ]
+    command += _encoder_args(None, preset, crf, tune, threads)
+    command += ["-movflags", "+faststart", output_filename]
+
+    if verbose:
+        import shlex
+
+        print(f"Running command: {shlex.join(command)}")
+    try:
+        return subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            bufsize=FFMPEG_PIPE_BUFSIZE,
+        )
+    except OSError as e:
+        raise VideoError(f"Could not start ffmpeg: {e}") from e
+
 
-    print(f"Running command: {' '.join(command)}")
+def compile_video_stream(
+    image_bytes_iter,
+    output_filename,
+    fps,
+    preset="ultrafast",
+    crf=23,
+    tune="stillimage",
+    threads=0,
+    verbose=False,
+):
+    """
+    Compiles in-memory images into a video by piping them to ffmpeg.
+
+    Unlike compile_video_ffmpeg the images are never read back from disk:
+    each encoded image (JPEG, PNG, ...) is written to ffmpeg's stdin and
+    demuxed with image2pipe. See compile_video_async to feed images while
+    they are still being produced.
+
+    Args:
+        image_bytes_iter (Iterable[bytes]) : Encoded images, in frame order.
+        output_filename (str) : Path for the output video file.
+        fps (int) : Framerate for the output video.
+        preset (str) : x264 preset, see compile_video_ffmpeg (default: 'ultrafast').
+        crf (int) : Constant Rate Factor, lower means better quality (default: 23).
+        tune (str) : x264 tuning; 'stillimage' suits mostly static scenes.
+        threads (int) : Encoder threads, 0 lets x264 use all cores (default: 0).
+        verbose (bool) : Print the ffmpeg command line (default: False).
 
+    Returns:
+        bool: True if compilation succeeded, False otherwise.
+    """
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=False)
+        process = compile_video_async(
+            output_filename, fps, preset, crf, tune, threads, verbose
+        )
+    except VideoError as e:
+        print(f"Error: {e}")
+        return False
+
+    try:
+        with process.stdin:
+            for image_bytes in image_bytes_iter:
+                process.stdin.write(image_bytes)
+    except BrokenPipeError:
+        # ffmpeg exited early; its return code below says why
+        pass
+    finally:
+        returncode = process.wait()
+
+    if returncode != 0:
+        print(f"\nError: ffmpeg compilation failed with return code {returncode}.")
+        return False
+    print(f"\nVideo compilation successful: {output_filename}")
+    return True
+
+
+class VideoStream:
+    """
+    Encodes raw BGR frames piped straight into ffmpeg's stdin.
+
+    Frames never touch the disk as JPEGs, which avoids the encode/decode
+    round trip of capturing images first and compiling them afterwards.
+    ffmpeg is started on the first frame, once the frame size is known.
+    The x264 settings match compile_video_ffmpeg's; with verbose, the ffmpeg
+    command line is printed when it starts.
+    """
+
+    def __init__(
+        self,
+        output_filename,
+        fps,
+        preset="ultrafast",
+        crf=23,
+        tune="stillimage",
+        threads=0,
+        verbose=False,
+    ):
+        self.output_filename = output_filename
+        self.fps = fps
+        self.verbose = verbose
+        self.encoder_args = _encoder_args(None, preset, crf, tune, threads)
+        self.frame_shape = None
+        self.process = None
+
+    def _start(self, frame_shape):
+        """Starts the ffmpeg process for frames of the given (h, w, 3) shape."""
+        import subprocess
 
-        # Print ffmpeg output (stderr often contains progress/info)
-        if result.stdout:
-            print("\n--- ffmpeg stdout ---")
-            print(result.stdout)
-        if result.stderr:
-            print("\n--- ffmpeg stderr ---")
-            print(result.stderr)  # Print errors or progress info
+        if not _ensure_output_dir(self.output_filename):
+            raise VideoError(
+                f"Cannot create output directory for {self.output_filename}"
+            )
+        height, width = frame_shape[:2]
+        command = [
+            _ffmpeg_path() or "ffmpeg",  # reported as an OSError if missing
+            "-y",
+            "-loglevel",
+            "error",  # only report problems while capture is running
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr24",  # OpenCV frame layout
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(self.fps),
+            "-i",
+            "-",  # frames arrive on stdin
+        ]
+        command += self.encoder_args
+        command += ["-movflags", "+faststart", self.output_filename]
+        if self.verbose:
+            import shlex
+
+            print(f"Running command: {shlex.join(command)}")
+        try:
+            self.process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+            )
+        except OSError as e:
+            raise VideoError(f"Could not start ffmpeg: {e}") from e
+        self.frame_shape = frame_shape
+
+    def write_frame(self, frame):
+        """
+        Sends one frame to ffmpeg.
 
-        if result.returncode != 0:
+        Args:
+            frame (numpy.ndarray) : BGR frame, as returned by OpenCV.
+
+        Returns:
+            bool: True if the frame was sent, False if it was skipped.
+        """
+        if self.process is None:
+            self._start(frame.shape)
+        elif frame.shape != self.frame_shape:
             print(
-                f"\nError: ffmpeg compilation failed with return code {result.returncode}."
+                f"Warning: Skipping frame of shape {frame.shape}, "
+                f"video stream expects {self.frame_shape}."
             )
             return False
-        else:
-            print(f"\nVideo compilation successful: {output_filename}")
-            return True
+        data = memoryview(frame)
+        if not data.c_contiguous:
+            data = memoryview(frame.tobytes())
+        try:
+            self.process.stdin.write(data.cast("B"))
+        except (BrokenPipeError, ValueError) as e:
+            raise VideoError(f"ffmpeg stopped accepting frames: {e}") from e
+        return True
 
-    except FileNotFoundError:
-        # This should theoretically be caught by check_ffmpeg, but as fallback
-        print("Error: ffmpeg command not found. Cannot compile video.")
-        return False
-    except Exception as e:
-        print(f"An unexpected error occurred during ffmpeg execution: {e}")
-        return False
+    def close(self):
+        """
+        Finishes the video once all frames are written.
+
+        Returns:
+            bool: True if ffmpeg produced the video, False otherwise.
+        """
+        if self.process is None:
+            print("\nVideo stream closed before any frames were written.")
+            return False
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        self.process = None
+        if returncode != 0:
+            print(f"\nError: ffmpeg streaming failed with return code {returncode}.")
+            return False
+        print(f"\nVideo compilation successful: {self.output_filename}")
+        return True